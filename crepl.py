@@ -8,15 +8,25 @@ A simple REPL for the C programming language.
 Author: Laszlo Szathmary (jabba.laci@gmail.com), 2025
 """
 
+import asyncio
+import csv
+import hashlib
 import os
+import pickle
 import re
 import readline
+import shlex
 import shutil
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from yachalk import chalk
 
-from lib import ascii, fs, process
+from lib import ascii, fs, process, pyshell
 from lib.cmanagers import ChDir
 
 VERSION = "0.0.2"
@@ -24,21 +34,73 @@ VERSION = "0.0.2"
 ROOT = os.path.dirname(os.path.realpath(__file__))
 TMP_DIR = os.path.join(ROOT, "tmp")
 SNIPPETS_DIR = os.path.join(ROOT, "snippets")
+CHECKPOINTS_DIR = os.path.join(TMP_DIR, "checkpoints")
 
 CC = "gcc"  # in package 'gcc'
 CLANG_FORMAT = "clang-format"  # in package 'clang'
 # under Ubuntu, it's "batcat"; under Manjaro, it's "bat"; "cat" is the fallback option
 CAT = "batcat,bat,cat"
 EDITOR = "micro"  # in package 'micro' ; can be replaced with vim/nvim too
-PYTHON3 = "python3"  # in package 'python'
 VALGRIND = "valgrind"  # in package 'valgrind'
 
+# if these appear in the source code, the output of the program can change from run to run
+# (it reads from the keyboard / from files, uses the clock, random numbers or threads),
+# thus its output cannot be cached (OpenMP is also checked, see OPENMP_PATTERN).
+# Any mention of stdin or read( counts, since the cached runs get an empty stdin.
+NON_DETERMINISTIC_CALLS = [
+    "stdin",
+    "read(",
+    "get_string(",
+    "scanf(",
+    "getchar(",
+    "gets(",
+    "fopen(",
+    "map_file(",
+    "getenv(",
+    "time(",
+    "clock(",
+    "rand(",
+    "random(",
+    "pthread_create(",
+]
+
+# if these appear in the source code, the program is compiled with "-fopenmp" / "-pthread"
+OPENMP_PATTERN = r"#\s*pragma\s+omp\b|\bomp_\w+\s*\("
+PTHREAD_PATTERN = r"\bpthread_\w+"
+
+# "_matrix" builds the program with each compiler and each set of flags
+MATRIX_COMPILERS = ["gcc", "clang"]
+MATRIX_FLAGS = ["-O0", "-O2", "-O3", "-O3 -march=native"]
+
+# "_opt" compiles with these flags and shows the remarks of gcc about vectorization and inlining
+OPT_FLAGS = "-O2 -fopt-info-vec-optimized -fopt-info-vec-missed -fopt-info-inline-optimized-missed"
+
+# C types of the arrays created with "_data", and their formats in the struct module (for CSV files)
+DATA_TYPES = {
+    "char": "b",
+    "unsigned char": "B",
+    "short": "h",
+    "unsigned short": "H",
+    "int": "i",
+    "unsigned int": "I",
+    "long": "l",
+    "unsigned long": "L",
+    "float": "f",
+    "double": "d",
+}
+
 # verify upon startup if these programs are available:
-REQUIRED_COMMANDS = [CC, CLANG_FORMAT, EDITOR, PYTHON3, VALGRIND]
+REQUIRED_COMMANDS = [CC, CLANG_FORMAT, EDITOR, VALGRIND]
 ##############################################################################
 
 
 def add_semicolon_if_needed(line: str) -> str:
+    if line.startswith("#pragma"):  # the semicolon belongs to the statement after it
+        pragma, _, statement = line.partition("\n")
+        if statement.strip() == "":
+            return line
+        return f"{pragma}\n{add_semicolon_if_needed(statement)}"
+    #
     if Parser.is_for_loop(line) or Parser.is_while_loop(line):
         if Parser.has_curly_brace(line):
             return line
@@ -102,6 +164,109 @@ class FileSystem:
             if not os.path.isfile(to_here):
                 shutil.copy(from_here, to_here)
 
+    @staticmethod
+    def copy_data_loader():
+        d = {
+            f"{SNIPPETS_DIR}/data_loader.h": f"{TMP_DIR}/data_loader.h",
+            f"{SNIPPETS_DIR}/data_loader.c": f"{TMP_DIR}/data_loader.c",
+        }
+        for from_here, to_here in d.items():
+            if not os.path.isfile(to_here):
+                shutil.copy(from_here, to_here)
+
+
+##############################################################################
+
+
+class DataFile:
+    """
+    Turn a binary or CSV file into something that the program can use without
+    having its content in the source code (thus the compile time doesn't depend on the data size).
+    """
+
+    @staticmethod
+    def get_cache_key(path: str, ctype: str) -> str:
+        st = os.stat(path)
+        text = f"{path}|{st.st_size}|{st.st_mtime_ns}|{ctype}"
+        return hashlib.sha256(text.encode("utf8")).hexdigest()[:16]
+
+    @staticmethod
+    def is_csv(path: str) -> bool:
+        return path.lower().endswith(".csv")
+
+    @staticmethod
+    def is_number(text: str) -> bool:
+        try:
+            float(text)
+            return True
+        except ValueError:
+            return False
+
+    @staticmethod
+    def convert_csv(path: str, ctype: str, out_path: str) -> None:
+        """
+        Raises ValueError / struct.error if a cell is not a number or it's out of range.
+        """
+        fmt = DATA_TYPES[ctype]
+        convert = float if fmt in "fd" else int
+        values = []
+        with open(path, newline="") as f:
+            for idx, row in enumerate(csv.reader(f)):
+                cells = [cell for cell in row if cell.strip()]
+                if idx == 0 and not all(DataFile.is_number(cell) for cell in cells):
+                    continue  # header
+                values.extend(convert(cell) for cell in cells)
+            #
+        #
+        Path(out_path).write_bytes(struct.pack(f"{len(values)}{fmt}", *values))
+
+    @staticmethod
+    def get_binary(path: str, ctype: str) -> str:
+        """
+        The file itself, or in the case of a CSV file, its (cached) binary version.
+        """
+        if not DataFile.is_csv(path):
+            return path
+        key = DataFile.get_cache_key(path, ctype)
+        bin_path = os.path.join(TMP_DIR, f"data_{key}.bin")
+        if not os.path.isfile(bin_path):
+            DataFile.convert_csv(path, ctype, bin_path)
+        return bin_path
+
+    @staticmethod
+    def build_object(name: str, path: str, ctype: str) -> str | None:
+        """
+        Create (or take from the cache) an object file that contains the array <name>
+        and its size in bytes (<name>_size). Returns the name of the object file (in TMP_DIR).
+        """
+        key = DataFile.get_cache_key(path, f"{name}|{ctype}")
+        obj = f"data_{name}_{key}.o"
+        if os.path.isfile(os.path.join(TMP_DIR, obj)):
+            return obj
+        #
+        binary = DataFile.get_binary(path, ctype).replace("\\", "\\\\").replace('"', '\\"')
+        asm = f"""
+    .section .rodata
+    .global {name}
+    .global {name}_size
+    .balign 16
+{name}:
+    .incbin "{binary}"
+{name}_end:
+    .balign 8
+{name}_size:
+    .quad {name}_end - {name}
+    .section .note.GNU-stack,"",@progbits
+""".lstrip("\n")
+        Path(TMP_DIR, f"data_{name}.S").write_text(asm)
+        cmd = [CC, "-c", f"data_{name}.S", "-o", obj]
+        exitcode, _, err = process.run(cmd, cwd=TMP_DIR)
+        if exitcode:
+            print(err)
+            return None
+        #
+        return obj
+
 
 ##############################################################################
 
@@ -120,6 +285,7 @@ class Source:
         self.function_definitions: list[str] = []
         self.main_body_lines: list[str] = []
         self.exit_code: str = "0"
+        self.watch_lines: list[str] = []  # ex.: "%d x" ; printed after each statement
 
     def get_source_code_path(self) -> str:
         return os.path.join(TMP_DIR, "main.c")
@@ -287,6 +453,37 @@ class Source:
     def get_lines(self) -> list[str]:
         return self.put_together().splitlines()
 
+    def get_line_origins(self) -> list[str]:
+        """
+        For each line of put_together(): the input that produced it (ex.: "(def) int sq(int x)").
+        Empty string for the lines generated by us.
+        """
+        self.put_together()  # it normalizes the exit code at the end of the main body
+        origins: list[str] = []
+        sections = [
+            ("", self.include_lines),
+            ("", self.define_lines),
+            ("(global) ", self.global_variable_lines),
+            ("", self.typedef_struct_lines),
+            ("(def) ", self.function_definitions),
+        ]
+        for prefix, entries in sections:
+            for entry in entries:
+                first = entry.split("\n")[0].removesuffix("// def").strip()
+                origins.extend([prefix + first] * len(entry.split("\n")))
+            if entries:
+                origins.append("")
+        #
+        origins.extend(["", ""])  # main's header
+        for entry in self.main_body_lines:
+            first = entry.split("\n")[0].strip()
+            if first.startswith("return"):
+                first = ""
+            origins.extend([first] * len(entry.split("\n")))
+        origins.append("")  # main's footer
+        #
+        return origins
+
     def read_source_code(self) -> str:
         with ChDir(TMP_DIR):
             with open("main.c") as f:
@@ -297,12 +494,11 @@ class Source:
         Pretty print with "bat".
         """
         binary = cat_command()
-        cmd = "cat main.c"
+        cmd = ["cat", "main.c"]
         if "bat" in binary:
-            cmd = f"{binary} -p main.c"
+            cmd = [binary, "-p", "main.c"]
         self.save_and_format_source_code()
-        with ChDir(TMP_DIR):
-            os.system(cmd)
+        process.call(cmd, cwd=TMP_DIR)
 
     def save_source_code(self) -> None:
         text = self.put_together()
@@ -311,9 +507,8 @@ class Source:
 
     def save_and_format_source_code(self) -> None:
         self.save_source_code()
-        cmd = f"{CLANG_FORMAT} --style=Microsoft -i main.c"
-        with ChDir(TMP_DIR):
-            os.system(cmd)
+        cmd = [CLANG_FORMAT, "--style=Microsoft", "-i", "main.c"]
+        process.call(cmd, cwd=TMP_DIR)
 
     def write_source_code(self, text: str) -> None:
         with ChDir(TMP_DIR):
@@ -321,27 +516,29 @@ class Source:
 
     def edit(self) -> None:
         self.save_and_format_source_code()
-        with ChDir(TMP_DIR):
-            cmd = f"{EDITOR} main.c"
-            os.system(cmd)
+        process.call([EDITOR, "main.c"], cwd=TMP_DIR)
         #
         self.reload_source_code()
 
-    def try_to_add_line(self, line: str, where: list[str], remove_add_exit_code=False) -> bool:
+    def try_to_add_line(
+        self, line: str, where: list[str], remove_add_exit_code=False, validate=True
+    ) -> bool:
         if remove_add_exit_code:
             self.remove_exit_code()
         where.append(line)
         if remove_add_exit_code:
             self.add_exit_code()
+        if not validate:  # it'll be validated later, see BackgroundCompiler
+            return True
         self.save_and_format_source_code()
-        return Compiler.try_to_compile(self.is_prog1_included())
+        return Compiler.try_to_compile(self.compiler_arguments)
 
     def rollback(self, old_code: str) -> None:
         self.write_source_code(old_code)
         self.reload_source_code()
 
     def add_line_to(
-        self, line: str, where: list[str], add_semicolon=False, inside_main=False
+        self, line: str, where: list[str], add_semicolon=False, inside_main=False, validate=True
     ) -> bool:
         backup = self.put_together()
         #
@@ -352,19 +549,71 @@ class Source:
         if add_semicolon:
             line = add_semicolon_if_needed(line)
         #
-        ok = self.try_to_add_line(line, where, remove_add_exit_code=remove_add_exit_code)
+        ok = self.try_to_add_line(
+            line, where, remove_add_exit_code=remove_add_exit_code, validate=validate
+        )
         if not ok:
             self.rollback(backup)
         #
         return ok
 
-    def build_printf(self, line: str) -> str:
+    def build_printf(self, line: str, with_label=False, comment="tmp") -> str:
         if "//" in line:
             left, _ = line.split("//")
             line = left.strip()
         #
         left, right = line.split(" ", maxsplit=1)
-        return 'printf("{0}\\n", {1}); // tmp'.format(left, right)
+        if with_label:
+            label = right.strip().replace("\\", "\\\\").replace('"', '\\"').replace("%", "%%")
+            left = f"{label} = {left}"
+        return 'printf("{0}\\n", {1}); // {2}'.format(left, right, comment)
+
+    def add_watch(self, line: str) -> bool:
+        line = line.strip()
+        if (not line.startswith("%")) or (" " not in line):
+            return False
+        if line not in self.watch_lines:
+            self.watch_lines.append(line)
+        return True
+
+    def remove_watch(self, line: str) -> None:
+        line = line.strip()
+        if line == "":
+            self.watch_lines = []
+        elif line in self.watch_lines:
+            self.watch_lines.remove(line)
+        #
+        if not self.watch_lines:  # the printf lines of the watches are not needed anymore
+            self.remove_watch_printfs()
+            self.save_and_format_source_code()
+
+    def remove_watch_printfs(self) -> None:
+        self.main_body_lines = [
+            line for line in self.main_body_lines if not line.endswith("// watch")
+        ]
+
+    def add_watch_block(self, line: str | None = None) -> bool:
+        """
+        Replace the previous "// watch" lines with one printf per watched expression.
+        If a line is given, it's added to the main body before them. All of them are
+        compiled together, thus the a.out of this validation prints the watches
+        (one build, no matter how many watches we have).
+        """
+        backup = self.put_together()
+        #
+        self.remove_exit_code()
+        self.remove_watch_printfs()
+        if line is not None:
+            self.main_body_lines.append(add_semicolon_if_needed(line))
+        for watch in self.watch_lines:
+            self.main_body_lines.append(self.build_printf(watch, with_label=True, comment="watch"))
+        self.add_exit_code()
+        self.save_and_format_source_code()
+        ok = Compiler.try_to_compile(self.compiler_arguments)
+        if not ok:
+            self.rollback(backup)
+        #
+        return ok
 
     def remove_previous_tmp_lines(self) -> None:
         lines: list[str] = self.get_lines()
@@ -387,9 +636,6 @@ class Source:
             self.write_source_code(new_src)
             self.reload_source_code()
 
-    def is_prog1_included(self) -> bool:
-        return "prog1.c" in self.compiler_arguments
-
     def include_prog1(self) -> None:
         line = '#include "prog1.h"'
         if line not in self.include_lines:
@@ -399,6 +645,86 @@ class Source:
             self.compiler_arguments.append(arg)
         FileSystem.copy_prog1()
 
+    def include_data_loader(self) -> None:
+        line = '#include "data_loader.h"'
+        if line not in self.include_lines:
+            self.include_lines.append(line)
+        arg = "data_loader.c"
+        if arg not in self.compiler_arguments:
+            self.compiler_arguments.append(arg)
+        FileSystem.copy_data_loader()
+
+    def remove_data_loader(self) -> None:
+        line = '#include "data_loader.h"'
+        if line in self.include_lines:
+            self.include_lines.remove(line)
+        arg = "data_loader.c"
+        if arg in self.compiler_arguments:
+            self.compiler_arguments.remove(arg)
+
+    def add_data(self, name: str, path: str, ctype: str) -> bool:
+        """
+        Link the file as the array <name> (see DataFile). Its length is <name>_len.
+        """
+        obj = DataFile.build_object(name, path, ctype)
+        if obj is None:
+            return False
+        backup = self.put_together()
+        backup_arguments = list(self.compiler_arguments)
+        #
+        self.remove_data(name)  # if it was imported before, the new version replaces it
+        self.define_lines.append(f"#define {name}_len ({name}_size / sizeof({name}[0]))")
+        self.global_variable_lines.append(f"extern const {ctype} {name}[];")
+        self.global_variable_lines.append(f"extern const size_t {name}_size;")
+        self.compiler_arguments.append(obj)
+        self.save_and_format_source_code()
+        ok = Compiler.try_to_compile(self.compiler_arguments)
+        if not ok:
+            self.rollback(backup)
+            self.compiler_arguments = backup_arguments
+        #
+        return ok
+
+    def remove_data(self, name: str) -> None:
+        """
+        Remove the object file and the declarations of a previous "_data <name> ...".
+        """
+        obj = re.compile(rf"data_{re.escape(name)}_[0-9a-f]{{16}}\.o")
+        self.compiler_arguments = [a for a in self.compiler_arguments if not obj.fullmatch(a)]
+        self.define_lines = [
+            line for line in self.define_lines if not line.startswith(f"#define {name}_len ")
+        ]
+        extern = re.compile(rf"extern const .*\b{re.escape(name)}(\[\]|_size);")
+        self.global_variable_lines = [
+            line for line in self.global_variable_lines if not extern.fullmatch(line.strip())
+        ]
+
+    def build_mmap_data_lines(self, name: str, path: str, ctype: str) -> str:
+        """
+        For very large files: the file is mapped into the memory when the program starts.
+        """
+        self.include_data_loader()
+        binary = DataFile.get_binary(path, ctype)
+        lines = [
+            f"size_t {name}_size;",
+            f"const {ctype} *{name} = map_file({Source.to_c_string(binary)}, &{name}_size);",
+            f"size_t {name}_len = {name}_size / sizeof({name}[0]);",
+        ]
+        return "\n".join(lines)
+
+    @staticmethod
+    def to_c_string(text: str) -> str:
+        text = text.replace("\\", "\\\\").replace('"', '\\"')
+        return f'"{text}"'
+
+    def add_compiler_argument(self, arg: str) -> None:
+        if arg not in self.compiler_arguments:
+            self.compiler_arguments.append(arg)
+
+    def remove_compiler_argument(self, arg: str) -> None:
+        if arg in self.compiler_arguments:
+            self.compiler_arguments.remove(arg)
+
     def add_stdlib_header(self, header_file: str) -> None:
         line = f"#include <{header_file}>"
         if line not in self.include_lines:
@@ -420,19 +746,47 @@ class Source:
     def contains(self, text) -> bool:
         return text in self.put_together()
 
+    def contains_pattern(self, pattern: str) -> bool:
+        return re.search(pattern, self.put_together()) is not None
+
     def contains_get_string(self) -> bool:
         return self.contains("get_string(")
 
+    def is_deterministic(self) -> bool:
+        code = self.put_together()
+        if re.search(OPENMP_PATTERN, code):
+            return False
+        return not any(call in code for call in NON_DETERMINISTIC_CALLS)
+
     def auto_include(self, line: str) -> None:
         if ("get_string(" in line) or self.contains_get_string():
             self.include_prog1()
         else:
             self.remove_prog1()
         #
+        if ("map_file(" in line) or self.contains("map_file("):
+            self.include_data_loader()
+        else:
+            self.remove_data_loader()
+        #
         if (text := "time(") in line or self.contains(text):
             self.add_stdlib_header("time.h")
         else:
             self.remove_stdlib_header("time.h")
+        #
+        if re.search(OPENMP_PATTERN, line) or self.contains_pattern(OPENMP_PATTERN):
+            self.add_stdlib_header("omp.h")
+            self.add_compiler_argument("-fopenmp")
+        else:
+            self.remove_stdlib_header("omp.h")
+            self.remove_compiler_argument("-fopenmp")
+        #
+        if re.search(PTHREAD_PATTERN, line) or self.contains_pattern(PTHREAD_PATTERN):
+            self.add_stdlib_header("pthread.h")
+            self.add_compiler_argument("-pthread")
+        else:
+            self.remove_stdlib_header("pthread.h")
+            self.remove_compiler_argument("-pthread")
 
 
 ##############################################################################
@@ -441,62 +795,268 @@ class Source:
 class Compiler:
     def __init__(self) -> None:
         self.src: Source = None  # will be set later in self.process()
-
-    def get_compile_cmd(self) -> str:
-        cmd = f"{CC} main.c"
-        for arg in self.src.compiler_arguments:
-            cmd += f" {arg}"
+        self.use_run_cache = False  # opt-in, see the command "_cache"
+        # key: hash of (binary, stdin, argv, environment) ; value: (exit code, stdout, stderr)
+        self.run_cache: dict[str, tuple[int, str, str]] = {}
+        # key: hash of (source code, compiler arguments) ; value: the report of "_opt"
+        self.opt_cache: dict[str, str] = {}
+        # (build hash, modification time of a.out) of the last build ; if both match, no compilation
+        self.built: tuple[str, int] | None = None
+
+    def get_compile_cmd(self, cc: str = CC, flags: str = "", output: str = "") -> list[str]:
+        cmd = [cc, "main.c"]
+        cmd.extend(self.src.compiler_arguments)
+        cmd.extend(flags.split())
+        if output:
+            cmd.extend(["-o", output])
         return cmd
 
+    def get_build_hash(self) -> str:
+        text = self.src.put_together() + repr(self.get_compile_cmd())
+        return hashlib.sha256(text.encode("utf8")).hexdigest()
+
+    @staticmethod
+    def get_binary_mtime() -> int | None:
+        exe = os.path.join(TMP_DIR, "a.out")
+        return os.stat(exe).st_mtime_ns if os.path.isfile(exe) else None
+
     def compile(self) -> None:
-        with ChDir(TMP_DIR):
-            cmd = self.get_compile_cmd()
-            os.system(cmd)
-            assert os.path.isfile("a.out")
+        build_hash = self.get_build_hash()
+        if self.built == (build_hash, self.get_binary_mtime()):
+            return  # a.out is up to date
+        exitcode = process.call(self.get_compile_cmd(), cwd=TMP_DIR)
+        assert os.path.isfile(os.path.join(TMP_DIR, "a.out"))
+        self.built = (build_hash, self.get_binary_mtime()) if exitcode == 0 else None
 
     @staticmethod
-    def try_to_compile(is_prog1_included: bool = False) -> bool:
+    def try_to_compile(compiler_arguments: list[str]) -> bool:
         result = True  # OK
-        with ChDir(TMP_DIR):
-            cmd = f"{CC} main.c"
-            if is_prog1_included:
-                cmd += " prog1.c"
-            exitcode, out, err = process.get_exitcode_stdout_stderr(cmd)
-            if exitcode:
-                result = False  # didn't compile -> there is an error
-                print(err)
-            #
+        cmd = [CC, "main.c", *compiler_arguments]
+        exitcode, out, err = process.run(cmd, cwd=TMP_DIR)
+        if exitcode:
+            result = False  # didn't compile -> there is an error
+            print(err)
         #
         return result
 
+    def toggle_run_cache(self) -> None:
+        self.use_run_cache = not self.use_run_cache
+        self.run_cache = {}
+
+    def get_run_cache_key(self, cmd: list[str], stdin_data: str) -> str:
+        h = hashlib.sha256()
+        h.update(Path(TMP_DIR, "a.out").read_bytes())
+        for part in (stdin_data, repr(cmd), repr(sorted(os.environ.items()))):
+            h.update(b"\0")
+            h.update(part.encode("utf8"))
+        return h.hexdigest()
+
+    def execute_cached(self, cmd: list[str], show_error: bool) -> None:
+        """
+        Run the program (with empty stdin) or take its result from the cache.
+        In the case of "_run", the output of a new run is shown while the program is running.
+        If it's interrupted with Ctrl+c, nothing is stored in the cache.
+        """
+        stdin_data = ""
+        key = self.get_run_cache_key(cmd, stdin_data)
+        if key in self.run_cache:
+            exitcode, out, err = self.run_cache[key]
+            if show_error:
+                self.print_result(exitcode, out, err)
+            else:
+                if out:
+                    print(out)
+                if err:
+                    print(err, file=sys.stderr)
+            #
+            return
+        #
+        try:
+            result = process.run(cmd, cwd=TMP_DIR, stdin_data=stdin_data, tee=not show_error)
+        except KeyboardInterrupt:
+            print()
+            return
+        self.run_cache[key] = result
+        if show_error:
+            self.print_result(*result)
+
+    def print_result(self, exitcode: int, out: str, err: str) -> None:
+        exitcode, crash_message = process.crash_message(exitcode)
+        if exitcode and err:
+            print("exit code:", exitcode)
+        if out:
+            print(out)
+        if err:
+            print("err:")
+            print(err)
+        if exitcode and err == "":
+            print("exit code:", exitcode)
+            if crash_message:
+                print(crash_message)
+
     def execute(self, show_error=False, valgrind=False) -> None:
-        with ChDir(TMP_DIR):
-            cmd = "./a.out"
-            if not show_error:
-                if valgrind:
-                    cmd = f"{VALGRIND} {cmd}"
-                #
-                os.system(cmd)
+        cmd = ["./a.out"]
+        if self.use_run_cache and (not valgrind) and self.src.is_deterministic():
+            self.execute_cached(cmd, show_error)
+            return
+        #
+        if not show_error:
+            if valgrind:
+                cmd = [VALGRIND, *cmd]
+            #
+            exitcode = process.call(cmd, cwd=TMP_DIR)
+            _, crash_message = process.crash_message(exitcode)
+            if crash_message:  # the shell used to print it for us
+                print(crash_message)
+        else:
+            if self.src.contains_get_string():
+                process.call(cmd, cwd=TMP_DIR)  # we need interactivity in this case
             else:
-                if self.src.contains_get_string():
-                    os.system(cmd)  # we need interactivity in this case
-                else:
-                    # if infinite loop happens, this hangs without any output
-                    exitcode, out, err = process.get_exitcode_stdout_stderr(cmd)
-                    if exitcode and err:
-                        print("exit code:", exitcode)
-                    if out:
-                        print(out)
-                    if err:
-                        print("err:")
-                        print(err)
-                    if exitcode and err == "":
-                        exitcode, output = process.capture_crash_message(cmd)
-                        print("exit code:", exitcode)
-                        print(output)
-                #
+                # if infinite loop happens, this hangs without any output
+                exitcode, out, err = process.run(cmd, cwd=TMP_DIR)
+                self.print_result(exitcode, out, err)
+            #
+        #
+
+    def matrix(self, src: Source) -> None:
+        """
+        Build the program with every compiler / flags combination (in parallel),
+        run each binary, and print a table about them.
+        """
+        self.src = src
+        self.src.save_source_code()
+        #
+        variants: list[tuple[str, str, str]] = []  # (compiler, flags, binary)
+        for cc in MATRIX_COMPILERS:
+            if not fs.which(cc):
+                print(f"warning: the compiler '{cc}' is not available, skipped")
+                continue
+            for flags in MATRIX_FLAGS:
+                variants.append((cc, flags, f"matrix_{len(variants)}.out"))
+            #
+        #
+        cmds = [self.get_compile_cmd(cc, flags, binary) for cc, flags, binary in variants]
+        with ProcessPoolExecutor() as pool:
+            builds = list(pool.map(compile_in_tmp_dir, cmds))
+        #
+        run_it = not self.src.contains_get_string()  # we don't want to wait for the keyboard
+        if not run_it:
+            print("note: the program reads from the keyboard, the binaries are not executed")
+        #
+        print(
+            f"{'compiler':<9} {'flags':<20} {'compile':>9} {'size':>10} "
+            f"{'runtime':>9} {'CPU time':>10}  output"
+        )
+        expected = None
+        for (cc, flags, binary), (exitcode, err, compile_time) in zip(variants, builds):
+            left = f"{cc:<9} {flags:<20}"
+            if exitcode:
+                print(f"{left} compilation failed: {err.splitlines()[0] if err else exitcode}")
+                continue
+            size = os.path.getsize(os.path.join(TMP_DIR, binary))
+            runtime, cpu_time, output = "-", "-", "-"
+            if run_it:
+                run_exitcode, out, err, elapsed, rusage = process.run_with_rusage(
+                    [f"./{binary}"], cwd=TMP_DIR
+                )
+                result = (run_exitcode, out, err)
+                if expected is None:
+                    expected = result
+                runtime = f"{elapsed:.3f} s"
+                cpu_time = f"{rusage.ru_utime + rusage.ru_stime:.3f} s"
+                output = "same" if result == expected else chalk.red("DIFFERENT")
+            #
+            print(
+                f"{left} {compile_time:>7.3f} s {size / 1024:>7.1f} KB "
+                f"{runtime:>9} {cpu_time:>10}  {output}"
+            )
+
+    def optimization_report(self, src: Source) -> str:
+        """
+        Compile with OPT_FLAGS and map the remarks of gcc back to the inputs
+        (statements of the main body and functions) that produced them.
+        """
+        self.src = src
+        code = self.src.put_together()
+        cmd = self.get_compile_cmd(flags=OPT_FLAGS, output="opt.out")
+        key = hashlib.sha256((code + repr(cmd)).encode("utf8")).hexdigest()
+        if key in self.opt_cache:
+            return self.opt_cache[key]
+        #
+        self.src.save_source_code()  # not formatted, thus the line numbers match get_line_origins()
+        exitcode, _, err = process.run(cmd, cwd=TMP_DIR)
+        if exitcode:
+            return err
+        origins = self.src.get_line_origins()
+        remarks: dict[str, list[str]] = {}  # origin -> remarks
+        seen: set[tuple[int, str]] = set()
+        found = []
+        for line in err.splitlines():
+            m = re.search(r"^main\.c:(\d+):\d+: (optimized|missed): +(.*)$", line)
+            if m:
+                lineno, kind, text = int(m.group(1)), m.group(2), m.group(3)
+                if (lineno, text) not in seen:
+                    seen.add((lineno, text))
+                    found.append((lineno, kind, text))
             #
         #
+        for lineno, kind, text in sorted(found, key=lambda t: t[0]):  # stable: gcc's order per line
+            origin = origins[lineno - 1] if lineno <= len(origins) else ""
+            color = chalk.green if kind == "optimized" else chalk.red
+            remarks.setdefault(origin or "(generated code)", []).append(
+                f"  line {lineno}: {color(kind)}: {text}"
+            )
+        #
+        lines = []
+        for origin, texts in remarks.items():
+            lines.append(chalk.bold(origin))
+            lines.extend(texts)
+        report = "\n".join(lines) if lines else "no remarks"
+        self.opt_cache[key] = report
+        return report
+
+    def scale(self, src: Source, thread_counts: list[int]) -> None:
+        """
+        Build the program with -O2, run it with different OMP_NUM_THREADS values,
+        and print the speedup / efficiency compared to the first run.
+        """
+        self.src = src
+        if self.src.contains_get_string():
+            print("note: the program reads from the keyboard, it cannot be measured")
+            return
+        self.src.save_source_code()
+        cmd = self.get_compile_cmd(flags="-O2", output="scale.out")
+        exitcode, _, err = process.run(cmd, cwd=TMP_DIR)
+        if exitcode:
+            print(err)
+            return
+        #
+        print(f"{'threads':>7} {'runtime':>10} {'speedup':>8} {'efficiency':>10}  output")
+        base: tuple[int, float] | None = None  # (threads, runtime) of the first run
+        expected = None
+        for n in thread_counts:
+            env = dict(os.environ, OMP_NUM_THREADS=str(n))
+            exitcode, out, err, elapsed, _ = process.run_with_rusage(
+                ["./scale.out"], cwd=TMP_DIR, env=env
+            )
+            if exitcode:
+                print(f"{n:>7} exit code: {exitcode} {err}")
+                continue
+            if base is None:
+                base, expected = (n, elapsed), out
+            speedup = base[1] / elapsed
+            efficiency = speedup / (n / base[0])
+            output = "same" if out == expected else chalk.red("DIFFERENT")
+            print(f"{n:>7} {elapsed:>8.3f} s {speedup:>7.2f}x {efficiency:>9.0%}  {output}")
+
+    def execute_validated(self, src: Source) -> None:
+        """
+        Run a.out that try_to_compile() has just built from the current source
+        (it's the same command as in compile()), without compiling it again.
+        """
+        self.src = src
+        self.built = (self.get_build_hash(), self.get_binary_mtime())
+        self.execute()
 
     def process(self, src: Source, show_error=False, valgrind=False) -> None:
         self.src = src
@@ -505,6 +1065,188 @@ class Compiler:
         self.execute(show_error, valgrind)
 
 
+def compile_in_tmp_dir(cmd: list[str]) -> tuple[int, str, float]:
+    """
+    Used by Compiler.matrix() in a worker process. Returns the exit code, the error messages
+    and the compile time.
+    """
+    start = time.perf_counter()
+    exitcode, _, err = process.run(cmd, cwd=TMP_DIR)
+    return exitcode, err, time.perf_counter() - start
+
+
+##############################################################################
+
+
+class BackgroundCompiler:
+    """
+    Validate the statements of the main body in the background, while the user types the next line.
+
+    The compilations run one after the other, in the order of submission. If a line
+    doesn't compile, then it's rolled back together with all the lines that came after it.
+    The rollback itself happens in the main thread (see sync()).
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.loop: asyncio.AbstractEventLoop = None  # will be started in self.enable()
+        self.queue_lock: asyncio.Lock = None
+        self.futures: list = []
+        self.state_lock = threading.Lock()
+        self.generation = 0  # incremented after each rollback; older jobs become obsolete
+        self.failed_backup: str | None = None  # source code before the first failed line
+        self.prompt = ">>> "  # set by main() before each input(), redrawn after an error
+
+    def enable(self) -> None:
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.queue_lock = asyncio.Lock()
+            threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.enabled = True
+
+    def disable(self, src: Source) -> None:
+        self.sync(src, wait=True)
+        self.enabled = False
+
+    def submit(self, code: str, compiler_arguments: list[str], backup: str, line: str) -> None:
+        with self.state_lock:
+            generation = self.generation
+        coro = self.validate(generation, code, compiler_arguments, backup, line)
+        self.futures.append(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def is_obsolete(self, generation: int) -> bool:
+        with self.state_lock:
+            return (generation != self.generation) or (self.failed_backup is not None)
+
+    async def validate(
+        self, generation: int, code: str, compiler_arguments: list[str], backup: str, line: str
+    ) -> None:
+        async with self.queue_lock:
+            if self.is_obsolete(generation):  # an earlier line failed, this one will be rolled back
+                return
+            Path(TMP_DIR, "pending.c").write_text(code)
+            cmd = [CC, "pending.c", *compiler_arguments, "-o", "pending.out"]
+            exitcode, _, err = await self.loop.run_in_executor(
+                None, lambda: process.run(cmd, cwd=TMP_DIR)
+            )
+            if exitcode == 0:
+                return
+            with self.state_lock:
+                if generation != self.generation or self.failed_backup is not None:
+                    return
+                self.failed_backup = backup
+            #
+            print()
+            print(err)
+            print(chalk.red(f"rolled back: {line} (and the lines after it)"))
+            print(self.prompt + readline.get_line_buffer(), end="", flush=True)
+
+    def wait(self) -> None:
+        for future in self.futures:
+            future.result()
+        self.futures = []
+
+    def sync(self, src: Source, wait=False) -> None:
+        """
+        Apply the rollback of a failed line (if any).
+        With wait=True, finish all the pending jobs first.
+        """
+        if self.loop is None:
+            return
+        if wait:
+            self.wait()
+        with self.state_lock:
+            backup, self.failed_backup = self.failed_backup, None
+            if backup is not None:
+                self.generation += 1
+        #
+        if backup is not None:
+            src.rollback(backup)
+
+
+##############################################################################
+
+
+class Checkpoint:
+    """
+    Named snapshots of a session (see the command "_ckpt"). A checkpoint contains the sections
+    of the source code (pickled, no parsing is needed), the readline history, main.c, the
+    binary and the generated object files. Thus, after a restore, "_run" doesn't compile.
+    """
+
+    @staticmethod
+    def get_dir(name: str) -> str:
+        return os.path.join(CHECKPOINTS_DIR, name)
+
+    @staticmethod
+    def is_valid_name(name: str) -> bool:
+        # not "." or "..", and no "/" ; the checkpoint must be a folder inside CHECKPOINTS_DIR
+        return re.fullmatch(r"[\w-][\w.-]*", name) is not None
+
+    @staticmethod
+    def get_names() -> list[str]:
+        if not os.path.isdir(CHECKPOINTS_DIR):
+            return []
+        return sorted(os.listdir(CHECKPOINTS_DIR))
+
+    @staticmethod
+    def get_artifacts(src: Source) -> list[str]:
+        """
+        Files in TMP_DIR that are needed to build / run the program.
+        """
+        result = ["main.c", "a.out"]
+        for arg in src.compiler_arguments:
+            if arg.endswith(".o"):
+                result.append(arg)
+        return [f for f in result if os.path.isfile(os.path.join(TMP_DIR, f))]
+
+    @staticmethod
+    def save(name: str, src: Source, compiler: Compiler) -> None:
+        compiler.src = src
+        src.save_and_format_source_code()
+        compiler.compile()  # if a.out is up to date, it does nothing
+        #
+        folder = Checkpoint.get_dir(name)
+        parent = os.path.dirname(os.path.realpath(folder))
+        assert parent == os.path.realpath(CHECKPOINTS_DIR), folder
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+        os.makedirs(folder)
+        artifacts = Checkpoint.get_artifacts(src)
+        for fname in artifacts:
+            shutil.copy2(os.path.join(TMP_DIR, fname), folder)
+        #
+        state = {
+            "source": vars(src),
+            "build_hash": compiler.built[0] if compiler.built else None,
+            "artifacts": artifacts,
+        }
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        Path(folder, "state.pickle").write_bytes(data)
+        readline.write_history_file(os.path.join(folder, "history"))
+
+    @staticmethod
+    def load(name: str, src: Source, compiler: Compiler) -> None:
+        folder = Checkpoint.get_dir(name)
+        state = pickle.loads(Path(folder, "state.pickle").read_bytes())
+        #
+        vars(src).update(state["source"])
+        for fname in state["artifacts"]:
+            shutil.copy2(os.path.join(folder, fname), TMP_DIR)
+        if "prog1.c" in src.compiler_arguments:
+            FileSystem.copy_prog1()
+        if "data_loader.c" in src.compiler_arguments:
+            FileSystem.copy_data_loader()
+        #
+        compiler.src = src
+        compiler.built = None
+        if state["build_hash"] == compiler.get_build_hash() and "a.out" in state["artifacts"]:
+            compiler.built = (state["build_hash"], compiler.get_binary_mtime())
+        #
+        readline.clear_history()
+        readline.read_history_file(os.path.join(folder, "history"))
+
+
 ##############################################################################
 
 
@@ -547,6 +1289,27 @@ class Parser:
 ##############################################################################
 
 
+def add_main_statement(
+    src: Source, compiler: Compiler, line: str, background: BackgroundCompiler
+) -> bool:
+    if background.enabled:  # the watches are not printed in this mode
+        backup = src.put_together()
+        src.add_line_to(line, src.main_body_lines, inside_main=True, validate=False)
+        background.submit(src.put_together(), list(src.compiler_arguments), backup, line)
+        return True
+    #
+    if src.watch_lines:
+        ok = src.add_watch_block(line)
+        if ok:
+            compiler.execute_validated(src)
+        return ok
+    #
+    return src.add_line_to(line, src.main_body_lines, inside_main=True)
+
+
+##############################################################################
+
+
 def print_header() -> None:
     print(f"{chalk.bold('C REPL')} v{VERSION} by Jabba Laci (jabba.laci@gmail.com), 2025")
     print('Type "h" or "help" for more information.')
@@ -567,6 +1330,7 @@ def main() -> None:
     print_header()
     src = Source()
     compiler = Compiler()
+    background = BackgroundCompiler()
 
     readline.parse_and_bind('"\\C-h": "help\\n"')  # help
     readline.parse_and_bind('"\\C-a": "_ascii\\n"')  # ASCII table
@@ -588,8 +1352,18 @@ def main() -> None:
         "_val",  # run the program with valgrind
         "_ed",  # edit main.c
         "_py",  # launch the Python shell
+        "_pyc",  # ex.: "_pyc n [long]" ; declare the Python variable n in C
         "_ascii",  # print ASCII table
         "_reset",  # reset main.c
+        "_ckpt",  # "_ckpt save name" / "_ckpt load name" ; without argument: list the checkpoints
+        "_data",  # ex.: "_data arr numbers.csv [int] [--mmap]" ; load a file as a C array
+        "_watch",  # ex.: "_watch %d x" ; print x after each statement ; without argument: list them
+        "_unwatch",  # ex.: "_unwatch %d x" ; without argument: remove all the watches
+        "_opt",  # show why gcc did or didn't vectorize / inline (at -O2)
+        "_scale",  # ex.: "_scale 1,2,4,8" ; run the program with different numbers of threads
+        "_matrix",  # build and run the program with several compilers and optimization levels
+        "_cache",  # toggle the run cache (the output of deterministic programs is reused)
+        "_async",  # toggle background compilation (the prompt doesn't wait for the compiler)
     ]
     shortcuts = [
         "Ctrl + e (edit), r (run), t (list), p (python), v (valgrind), a (ASCII), h (help)"
@@ -605,7 +1379,8 @@ def main() -> None:
         if read_next_line:
             prompt = "... "
         try:
-            inp = input(chalk.blue.bold(prompt)).strip()
+            background.prompt = chalk.blue.bold(prompt)
+            inp = input(background.prompt).strip()
         except KeyboardInterrupt:  # Ctrl+c
             print()
             break
@@ -631,9 +1406,14 @@ def main() -> None:
                     src.add_line_to(snippet, src.function_definitions)
                     inside_function_definition = False
                 else:
-                    src.add_line_to(snippet, src.main_body_lines, inside_main=True)
+                    add_main_statement(src, compiler, snippet, background)
                 continue
         #
+        # commands must see the validated source code -> wait for the background compiler
+        wait = inp.startswith(("_", "%", "#", "(", "typedef ", "struct "))
+        wait = wait or inp in ("qq", "h", "help")
+        background.sync(src, wait=wait)
+        #
         src.auto_include(inp)  # ex.: if "get_string(" is present -> include "prog1.h"
         #
         if "//" in inp:
@@ -673,8 +1453,88 @@ def main() -> None:
         # src.save_and_format_source_code()
         elif inp == "_ed":  # edit
             src.edit()
+        elif inp == "_ckpt":
+            for name in Checkpoint.get_names():
+                print(name)
+        elif inp.startswith("_ckpt "):
+            parts = inp.split()
+            ok = len(parts) == 3 and parts[1] in ("save", "load")
+            if not ok or not Checkpoint.is_valid_name(parts[2]):
+                print("usage: _ckpt save name / _ckpt load name")
+            elif parts[1] == "save":
+                Checkpoint.save(parts[2], src, compiler)
+                print("saved to", Checkpoint.get_dir(parts[2]))
+            elif parts[2] not in Checkpoint.get_names():
+                print(f"warning: there is no checkpoint called '{parts[2]}'")
+            else:
+                Checkpoint.load(parts[2], src, compiler)
+                print("loaded")
         elif inp == "_reset":
             src = Source()
+        elif inp == "_async":
+            if background.enabled:
+                background.disable(src)
+            else:
+                background.enable()
+            print("background compilation:", "on" if background.enabled else "off")
+        elif inp.startswith("_data "):
+            parts = shlex.split(inp)
+            use_mmap = "--mmap" in parts
+            parts = [p for p in parts if p != "--mmap"]
+            if len(parts) < 3 or not parts[1].isidentifier():
+                print("usage: _data name file [type] [--mmap]")
+                continue
+            name, path = parts[1], os.path.abspath(os.path.expanduser(parts[2]))
+            ctype = " ".join(parts[3:]) or ("double" if DataFile.is_csv(path) else "unsigned char")
+            if not os.path.isfile(path):
+                print(f"warning: {path} not found")
+            elif ctype not in DATA_TYPES:
+                print("supported types:", ", ".join(DATA_TYPES))
+            else:
+                try:
+                    if use_mmap:
+                        lines = src.build_mmap_data_lines(name, path, ctype)
+                        add_main_statement(src, compiler, lines, background)
+                    elif src.add_data(name, path, ctype):
+                        print(f"{name}[{name}_len] is available")
+                except (ValueError, struct.error) as e:
+                    print(f"error: cannot convert {path} to {ctype}: {e}")
+        elif inp == "_opt":
+            print(compiler.optimization_report(src))
+        elif inp == "_scale" or inp.startswith("_scale "):
+            text = inp.removeprefix("_scale").strip()
+            try:
+                if text:
+                    thread_counts = [int(n) for n in text.split(",")]
+                else:
+                    thread_counts = [1 << i for i in range((os.cpu_count() or 1).bit_length())]
+            except ValueError:
+                print("usage: _scale 1,2,4,8")
+                continue
+            if any(n < 1 for n in thread_counts):
+                print("usage: _scale 1,2,4,8")
+                continue
+            compiler.scale(src, thread_counts)
+        elif inp == "_matrix":
+            compiler.matrix(src)
+        elif inp == "_cache":
+            compiler.toggle_run_cache()
+            print("run cache:", "on" if compiler.use_run_cache else "off")
+        elif inp == "_watch":
+            for watch in src.watch_lines:
+                print(watch)
+        elif inp.startswith("_watch "):
+            watch = inp.removeprefix("_watch ")
+            if not src.add_watch(watch):
+                print("usage: _watch %d x")
+            elif src.add_watch_block():
+                compiler.execute_validated(src)
+            else:
+                src.remove_watch(watch)
+        elif inp == "_unwatch" or inp.startswith("_unwatch "):
+            src.remove_watch(inp.removeprefix("_unwatch"))
+            if src.watch_lines and src.add_watch_block():  # without the removed one
+                compiler.execute_validated(src)
         elif inp.startswith("%"):
             line = src.build_printf(inp)
             if src.add_line_to(line, src.main_body_lines, inside_main=True):
@@ -683,14 +1543,14 @@ def main() -> None:
         elif Parser.is_for_loop(inp):  # for (...)
             ok = Parser.check(inp)
             if ok:
-                src.add_line_to(inp, src.main_body_lines, inside_main=True)
+                add_main_statement(src, compiler, inp, background)
             else:
                 collected_lines.append(inp)
                 read_next_line = True
         elif Parser.is_while_loop(inp):  # while (...)
             ok = Parser.check(inp)
             if ok:
-                src.add_line_to(inp, src.main_body_lines, inside_main=True)
+                add_main_statement(src, compiler, inp, background)
             else:
                 collected_lines.append(inp)
                 read_next_line = True
@@ -704,6 +1564,9 @@ def main() -> None:
                 inside_function_definition = True
                 collected_lines.append(inp)
                 read_next_line = True
+        elif inp.startswith("#pragma"):  # it belongs to the next statement (ex.: "#pragma omp for")
+            collected_lines.append(inp)
+            read_next_line = True
         elif inp.startswith("#include"):
             src.add_line_to(inp, src.include_lines)
         elif inp.startswith("#define "):
@@ -718,7 +1581,7 @@ def main() -> None:
                 read_next_line = True
         elif inp.startswith("struct "):
             if "{" not in inp:
-                src.add_line_to(inp, src.main_body_lines, inside_main=True)
+                add_main_statement(src, compiler, inp, background)
             else:
                 ok = Parser.check(inp)
                 if ok:
@@ -739,16 +1602,23 @@ def main() -> None:
                 src.add_line_to(inp, src.global_variable_lines, add_semicolon=True)
         elif inp.startswith(options := ("(p)", "(p3)", "(py)", "(py3)", "(python)", "(python3)")):
             inp = remove_prefix(inp, options).strip()
-            cmd = f"""{PYTHON3} -c 'print({inp})'"""
-            # print("#", cmd)
-            os.system(cmd)
+            pyshell.evaluate(inp)
         elif inp in ("_py", "_py3"):
-            os.system(PYTHON3)
+            pyshell.interact()
             print("# C REPL again:")
+        elif inp.startswith("_pyc "):
+            parts = inp.split()
+            name = parts[1]
+            ctype = " ".join(parts[2:]) or None
+            line = pyshell.to_c_declaration(name, ctype)
+            if line is None:
+                print(f"warning: cannot declare the Python variable '{name}' in C")
+            else:
+                add_main_statement(src, compiler, line, background)
         elif inp == "_ascii":
             ascii.print_ascii_table()
         else:
-            src.add_line_to(inp, src.main_body_lines, inside_main=True)
+            add_main_statement(src, compiler, inp, background)
 
 
 ##############################################################################
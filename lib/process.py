@@ -1,41 +1,142 @@
-import shlex
+"""
+Every external command is started here.
+
+The commands are argument lists, there is no intermediate shell (thus no quoting
+problems). On Linux, CPython starts them with vfork(), which is cheap even
+from a big process.
+"""
+
+import os
+import signal
 import subprocess
-from subprocess import PIPE, Popen
+import sys
+import tempfile
+import threading
+import time
+from subprocess import DEVNULL, PIPE, STDOUT, Popen
+
+TIMEOUT_EXITCODE = 124  # same as in the case of the command "timeout"
 
 
-def get_exitcode_stdout_stderr(cmd):
+def call(args, cwd=None, env=None, timeout=None):
     """
-    Execute the external command and get its exitcode, stdout and stderr.
+    Execute the external command with the terminal passed through
+    (the command can read the keyboard and print to the screen). Returns its exit code.
     """
-    args = shlex.split(cmd)
+    proc = Popen(args, cwd=cwd, env=env)
+    try:
+        return proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        return TIMEOUT_EXITCODE
+    except KeyboardInterrupt:  # Ctrl+c stops the command only
+        proc.wait()
+        return proc.returncode
+
 
-    proc = Popen(args, stdout=PIPE, stderr=PIPE)
-    out, err = proc.communicate()
-    out, err = out.decode("utf8"), err.decode("utf8")
-    exitcode = proc.returncode
+def echo_pipe(pipe, stream, chunks):
+    """
+    Read the pipe until EOF. Everything is printed to the stream and collected in chunks.
+    """
+    while chunk := os.read(pipe.fileno(), 4096):
+        chunks.append(chunk)
+        stream.buffer.write(chunk)
+        stream.buffer.flush()
+
+
+def communicate_and_echo(proc, data, timeout):
+    """
+    Like proc.communicate(), but the output is also printed while the command is running.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    out_chunks, err_chunks = [], []
+    threads = [threading.Thread(target=echo_pipe, args=(proc.stdout, sys.stdout, out_chunks))]
+    if proc.stderr:
+        threads.append(
+            threading.Thread(target=echo_pipe, args=(proc.stderr, sys.stderr, err_chunks))
+        )
+    for t in threads:
+        t.daemon = True
+        t.start()
+    if proc.stdin:
+        try:
+            proc.stdin.write(data)
+            proc.stdin.close()
+        except BrokenPipeError:  # the command doesn't read its stdin
+            pass
+    try:
+        proc.wait(timeout=timeout)
+    finally:
+        if proc.returncode is None:  # timeout or Ctrl+c ; the pipes are closed by the kill
+            proc.kill()
+            proc.wait()
+        for t in threads:
+            t.join()
+    #
+    return b"".join(out_chunks), b"".join(err_chunks)
+
+
+def run(args, cwd=None, env=None, timeout=None, stdin_data=None, merge_stderr=False, tee=False):
+    """
+    Execute the external command and get its exitcode, stdout and stderr.
+
+    If stdin_data is given, it's fed to the command's stdin. If merge_stderr is True,
+    stderr is merged into stdout (and the returned stderr is empty). If tee is True,
+    the output is also printed while the command is running.
+    If the command was killed by a signal, the exit code is negative (ex.: -11).
+    With Ctrl+c, the command is killed and KeyboardInterrupt is raised again.
+    """
+    stdin = None if stdin_data is None else PIPE
+    stderr = STDOUT if merge_stderr else PIPE
+    proc = Popen(args, cwd=cwd, env=env, stdin=stdin, stdout=PIPE, stderr=stderr)
+    data = None if stdin_data is None else stdin_data.encode("utf8")
+    try:
+        if tee:
+            out, err = communicate_and_echo(proc, data, timeout)
+        else:
+            out, err = proc.communicate(data, timeout=timeout)
+        exitcode = proc.returncode
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        out, err = (b"", b"") if tee else proc.communicate()
+        err = (err or b"") + f"timeout after {timeout} seconds".encode("utf8")
+        exitcode = TIMEOUT_EXITCODE
+    except KeyboardInterrupt:
+        proc.kill()
+        proc.wait()
+        raise
+    out, err = out.decode("utf8", errors="replace"), (err or b"").decode("utf8", errors="replace")
     #
     return exitcode, out.rstrip("\n"), err.rstrip("\n")
 
 
-def capture_crash_message(cmd):
+def run_with_rusage(args, cwd=None, env=None):
     """
-    Absolutely captures segfault messages by:
-    1. Forcing shell output through a pipe
-    2. Merging stdout/stderr
-    3. Using bash explicitly for consistent behavior
+    Like run(), but it also returns the elapsed (wall-clock) time
+    and the resource usage (see resource.getrusage()) of the command. The command gets no stdin.
     """
-    proc = subprocess.Popen(
-        f"bash -c '{cmd} 2>&1'",  # Force all output to stdout
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,  # Merge stderr into stdout
-        universal_newlines=True,
-    )
-    output, _ = proc.communicate()
-    exitcode = proc.returncode
+    with tempfile.TemporaryFile() as out_f, tempfile.TemporaryFile() as err_f:
+        start = time.perf_counter()
+        proc = Popen(args, cwd=cwd, env=env, stdin=DEVNULL, stdout=out_f, stderr=err_f)
+        _, status, rusage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - start
+        proc.returncode = exitcode = os.waitstatus_to_exitcode(status)
+        out_f.seek(0)
+        err_f.seek(0)
+        out = out_f.read().decode("utf8", errors="replace")
+        err = err_f.read().decode("utf8", errors="replace")
+    #
+    return exitcode, out.rstrip("\n"), err.rstrip("\n"), elapsed, rusage
 
-    # Normalize signal exits (e.g., -11 → 139)
-    if exitcode < 0:
-        exitcode = 128 + (-exitcode)
 
-    return exitcode, output.strip()
+def crash_message(exitcode):
+    """
+    If the command was killed by a signal, return the exit code and the message that
+    a shell would show (ex.: 139 and "Segmentation fault"). Otherwise, the message is empty.
+    """
+    if exitcode >= 0:
+        return exitcode, ""
+    # else
+    return 128 + (-exitcode), signal.strsignal(-exitcode) or f"killed by signal {-exitcode}"
@@ -0,0 +1,129 @@
+import code
+import math
+import sys
+
+# -2**63 is also a long, but it cannot be written as a literal (2**63 is too large)
+LONG_MAX = 2**63 - 1
+
+
+class Quitter:
+    """
+    Like the built-in exit() / quit(), but it doesn't close sys.stdin (C REPL still needs it).
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"Use {self.name}() or Ctrl-D (i.e. EOF) to exit"
+
+    def __call__(self, code=None):
+        raise SystemExit(code)
+
+
+# shared by "(p) expr" and "_py", thus the variables are kept between the calls
+namespace: dict = {"__name__": "__crepl__", "exit": Quitter("exit"), "quit": Quitter("quit")}
+
+
+def evaluate(text: str) -> None:
+    """
+    Evaluate a Python expression and print its value.
+    If it's not an expression (ex.: "n = 2 ** 31 - 1"), then it's executed.
+    """
+    try:
+        try:
+            compiled = compile(text, "<crepl>", "eval")
+        except SyntaxError:
+            exec(compile(text, "<crepl>", "exec"), namespace)
+            return
+        value = eval(compiled, namespace)
+        if value is not None:
+            namespace["_"] = value
+            print(value)
+    except SystemExit:  # "(p) exit()" must not quit from C REPL
+        pass
+    except Exception as e:
+        print(f"{type(e).__name__}: {e}")
+
+
+def interact() -> None:
+    """
+    Launch an interactive Python shell. Quit with Ctrl + d (or exit()).
+    """
+    banner = "Python {0} on {1}\n{2}".format(
+        sys.version,
+        sys.platform,
+        'Type "help", "copyright", "credits" or "license" for more information.',
+    )
+    console = code.InteractiveConsole(locals=namespace)
+    try:
+        console.interact(banner=banner, exitmsg="")
+    except SystemExit:  # exit() / quit() only leaves the Python shell
+        pass
+
+
+def to_c_literal(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, str):
+        text = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return f'"{text}"'
+    if isinstance(value, (list, tuple)):
+        return "{" + ", ".join(to_c_literal(x) for x in value) + "}"
+    # else
+    return repr(value)
+
+
+def is_convertible(value, inside_list=False) -> bool:
+    """
+    Can the value be written as a C literal? Nested lists, non-finite floats
+    and integers out of the range of long cannot.
+    """
+    if isinstance(value, bool) or isinstance(value, str):
+        return True
+    if isinstance(value, int):
+        return -LONG_MAX <= value <= LONG_MAX
+    if isinstance(value, float):
+        return math.isfinite(value)
+    if isinstance(value, (list, tuple)) and not inside_list:
+        return len(value) > 0 and all(is_convertible(x, inside_list=True) for x in value)
+    # else
+    return False
+
+
+def guess_c_type(value) -> str | None:
+    if isinstance(value, (bool, int)):
+        return "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, (list, tuple)) and value:
+        types = {guess_c_type(x) for x in value}
+        if len(types) == 1:
+            return types.pop()
+        if types == {"long", "double"}:
+            return "double"
+    #
+    return None
+
+
+def to_c_declaration(name: str, ctype: str | None = None) -> str | None:
+    """
+    Build a C declaration from a Python variable, ex.: "long n = 2147483647".
+    If the C type is not given, it's guessed from the Python value.
+    Returns None if the variable doesn't exist, its value cannot be written in C,
+    or its type cannot be guessed.
+    """
+    if name not in namespace:
+        return None
+    value = namespace[name]
+    if not is_convertible(value):
+        return None
+    ctype = ctype or guess_c_type(value)
+    if ctype is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return f"{ctype} {name}[] = {to_c_literal(value)}"
+    # else
+    return f"{ctype} {name} = {to_c_literal(value)}"
@@ -0,0 +1,40 @@
+#include "data_loader.h"
+
+//////////////////////////////////////////////////////////////////////////////
+//
+//   Implementation
+//
+
+#include <fcntl.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+/**
+ * Map a file into the memory (read-only). Its size (in bytes)
+ * is stored in *size. The mapping is never unmapped, it lives
+ * until the end of the program. On error, the program exits.
+ */
+const void* map_file(const char* path, size_t* size)
+{
+    int fd = open(path, O_RDONLY);
+    if (fd == -1) {
+        perror(path);
+        exit(1);
+    }
+
+    struct stat st;
+    fstat(fd, &st);
+    *size = st.st_size;
+
+    void* p = mmap(NULL, st.st_size > 0 ? st.st_size : 1, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (p == MAP_FAILED) {
+        perror(path);
+        exit(1);
+    }
+
+    return p;
+}
@@ -0,0 +1,13 @@
+#ifndef DATA_LOADER_H
+#define DATA_LOADER_H
+
+#include <stddef.h>
+
+//////////////////////////////////////////////////////////////////////////////
+//
+//   Public Interface
+//
+
+const void* map_file(const char* path, size_t* size);
+
+#endif    // DATA_LOADER_H